@@ -3,14 +3,43 @@
 """
 import pandas as pd
 from src.data_fetcher import DataFetcher, TAIWAN_STOCKS
-from src.indicators import TechnicalIndicators
+from src.indicators import calculate_indicators_batch
 from src.backtester import Backtester
 from datetime import datetime
+from typing import Optional
 import os
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings('ignore')
 
 
+def _save_stock_result(symbol: str, result: dict, output_dir: str) -> Optional[str]:
+    """
+    將單一股票的策略比較結果寫入 CSV（於執行緒池中執行）
+    
+    Args:
+        symbol: 股票代碼
+        result: 該股票的回測結果字典
+        output_dir: 輸出目錄
+    
+    Returns:
+        寫入的檔案路徑，沒有結果時回傳 None
+    """
+    stock_df = result.get('comparison_df', pd.DataFrame())
+    date_range = result.get('date_range', datetime.now().strftime("%Y%m%d"))
+    if stock_df.empty:
+        return None
+    
+    # 添加股票資訊
+    stock_df = stock_df.copy()
+    stock_df.insert(0, '股票代碼', symbol)
+    stock_df.insert(1, '股票名稱', result['name'])
+    # 使用格式：股票代號_開始日期_to_結束日期.csv
+    stock_file = os.path.join(output_dir, f"{symbol}_{date_range}.csv")
+    stock_df.to_csv(stock_file, index=False, encoding='utf-8-sig')
+    return stock_file
+
+
 def main():
     """主函數：執行完整的回測流程"""
     print("=" * 60)
@@ -53,21 +82,20 @@ def main():
     print("步驟 3: 執行技術指標回測...")
     print("=" * 60)
     
+    # 批次計算所有股票的技術指標
+    indicator_data = calculate_indicators_batch(stock_data)
+    
+    # 回測引擎不保存個股狀態，所有股票共用同一個實例
+    # 逐檔在主程序執行：每檔的計算量遠低於子程序的啟動與數據序列化成本，以程序池平行反而較慢
+    backtester = Backtester(initial_capital=1000000)
     all_results = {}
     
-    for symbol, data in stock_data.items():
+    for symbol, data_with_indicators in indicator_data.items():
         stock_name = fetcher.get_stock_name(symbol)
         print(f"\n正在回測: {stock_name} ({symbol})")
         print("-" * 60)
         
         try:
-            # 計算技術指標
-            indicator_calc = TechnicalIndicators(data)
-            data_with_indicators = indicator_calc.calculate_all_indicators()
-            
-            # 初始化回測引擎
-            backtester = Backtester(initial_capital=1000000)
-            
             # 回測所有策略
             metrics = backtester.backtest_all_strategies(data_with_indicators)
             
@@ -84,7 +112,6 @@ def main():
                 'name': stock_name,
                 'metrics': metrics,
                 'comparison_df': comparison_df,
-                'data': data_with_indicators,
                 'date_range': f"{data_start}_to_{data_end}"
             }
             
@@ -97,40 +124,34 @@ def main():
     print("回測總結報告")
     print("=" * 60)
     
+    # 將所有股票 x 策略的績效整理為一張長表，供後續彙總使用
+    all_df = pd.DataFrame(
+        [
+            {'symbol': symbol, 'name': result['name'], **metric}
+            for symbol, result in all_results.items()
+            for metric in result['metrics'].values()
+            if metric is not None
+        ],
+        columns=['symbol', 'name', 'strategy', 'total_return', 'annualized_return', 'volatility',
+                 'sharpe_ratio', 'max_drawdown', 'win_rate', 'total_trades'],
+    )
+    
     # 計算各策略的平均績效
-    strategy_summary = {}
-    for symbol, result in all_results.items():
-        metrics = result['metrics']
-        for strategy_name, metric in metrics.items():
-            if metric is not None:
-                if strategy_name not in strategy_summary:
-                    strategy_summary[strategy_name] = {
-                        'total_returns': [],
-                        'sharpe_ratios': [],
-                        'max_drawdowns': [],
-                        'win_rates': [],
-                    }
-                strategy_summary[strategy_name]['total_returns'].append(metric['total_return'])
-                strategy_summary[strategy_name]['sharpe_ratios'].append(metric['sharpe_ratio'])
-                strategy_summary[strategy_name]['max_drawdowns'].append(metric['max_drawdown'])
-                strategy_summary[strategy_name]['win_rates'].append(metric['win_rate'])
+    strategy_summary = all_df.groupby('strategy', sort=False)[
+        ['total_return', 'sharpe_ratio', 'max_drawdown', 'win_rate']
+    ].mean()
     
     # 顯示平均績效
     print("\n各策略平均績效（跨所有測試股票）:")
     print("-" * 60)
     summary_data = []
-    for strategy_name, stats in strategy_summary.items():
-        avg_return = sum(stats['total_returns']) / len(stats['total_returns'])
-        avg_sharpe = sum(stats['sharpe_ratios']) / len(stats['sharpe_ratios'])
-        avg_drawdown = sum(stats['max_drawdowns']) / len(stats['max_drawdowns'])
-        avg_winrate = sum(stats['win_rates']) / len(stats['win_rates'])
-        
+    for stats in strategy_summary.itertuples():
         summary_data.append({
-            '策略': strategy_name,
-            '平均總報酬率 (%)': f"{avg_return:.2f}",
-            '平均夏普比率': f"{avg_sharpe:.2f}",
-            '平均最大回撤 (%)': f"{avg_drawdown:.2f}",
-            '平均勝率 (%)': f"{avg_winrate:.2f}",
+            '策略': stats.Index,
+            '平均總報酬率 (%)': f"{stats.total_return:.2f}",
+            '平均夏普比率': f"{stats.sharpe_ratio:.2f}",
+            '平均最大回撤 (%)': f"{stats.max_drawdown:.2f}",
+            '平均勝率 (%)': f"{stats.win_rate:.2f}",
         })
     
     summary_df = pd.DataFrame(summary_data)
@@ -141,77 +162,41 @@ def main():
     print("各策略表現最佳前三名股票（依年化報酬率排序）")
     print("=" * 60)
     
-    # 收集所有策略的股票績效數據
-    strategy_stocks = {}
-    for symbol, result in all_results.items():
-        stock_name = result['name']
-        metrics = result['metrics']
-        for strategy_name, metric in metrics.items():
-            if metric is not None:
-                if strategy_name not in strategy_stocks:
-                    strategy_stocks[strategy_name] = []
-                strategy_stocks[strategy_name].append({
-                    'symbol': symbol,
-                    'name': stock_name,
-                    'total_return': metric['total_return'],
-                    'annualized_return': metric['annualized_return'],
-                    'sharpe_ratio': metric['sharpe_ratio'],
-                    'max_drawdown': metric['max_drawdown'],
-                    'win_rate': metric['win_rate'],
-                    'volatility': metric['volatility'],
-                    'total_trades': metric['total_trades'],
-                })
+    # 依年化報酬率排序（降序）後，取每個策略的前三名
+    top3_df = all_df.sort_values('annualized_return', ascending=False, kind='stable').groupby('strategy').head(3)
     
-    # 對每個策略，找出前三名
-    for strategy_name in sorted(strategy_stocks.keys()):
-        stocks = strategy_stocks[strategy_name]
-        # 依年化報酬率排序（降序）
-        stocks_sorted = sorted(stocks, key=lambda x: x['annualized_return'], reverse=True)
-        top3 = stocks_sorted[:3]
-        
+    for strategy_name, top3 in top3_df.groupby('strategy'):
         print(f"\n【{strategy_name} 策略】")
         print("-" * 60)
         
-        if len(top3) == 0:
-            print("  無有效數據")
-            continue
-        
-        for rank, stock in enumerate(top3, 1):
-            print(f"\n第 {rank} 名: {stock['name']} ({stock['symbol']})")
-            print(f"  年化報酬率: {stock['annualized_return']:.2f}%")
-            print(f"  總報酬率:   {stock['total_return']:.2f}%")
-            print(f"  夏普比率:   {stock['sharpe_ratio']:.2f}")
-            print(f"  最大回撤:   {stock['max_drawdown']:.2f}%")
-            print(f"  波動率:     {stock['volatility']:.2f}%")
-            print(f"  勝率:       {stock['win_rate']:.2f}%")
-            print(f"  交易次數:   {stock['total_trades']}")
+        for rank, stock in enumerate(top3.itertuples(index=False), 1):
+            print(f"\n第 {rank} 名: {stock.name} ({stock.symbol})")
+            print(f"  年化報酬率: {stock.annualized_return:.2f}%")
+            print(f"  總報酬率:   {stock.total_return:.2f}%")
+            print(f"  夏普比率:   {stock.sharpe_ratio:.2f}")
+            print(f"  最大回撤:   {stock.max_drawdown:.2f}%")
+            print(f"  波動率:     {stock.volatility:.2f}%")
+            print(f"  勝率:       {stock.win_rate:.2f}%")
+            print(f"  交易次數:   {stock.total_trades}")
     
     # 5. 輸出結果到 CSV
     print("\n" + "=" * 60)
     print("正在生成 CSV 報告...")
     print("=" * 60)
     
-    # 創建詳細結果 DataFrame（每檔股票 x 每個策略）
-    detailed_results = []
-    for symbol, result in all_results.items():
-        stock_name = result['name']
-        metrics = result['metrics']
-        for strategy_name, metric in metrics.items():
-            if metric is not None:
-                detailed_results.append({
-                    '股票代碼': symbol,
-                    '股票名稱': stock_name,
-                    '策略': strategy_name,
-                    '總報酬率 (%)': f"{metric['total_return']:.2f}",
-                    '年化報酬率 (%)': f"{metric['annualized_return']:.2f}",
-                    '波動率 (%)': f"{metric['volatility']:.2f}",
-                    '夏普比率': f"{metric['sharpe_ratio']:.2f}",
-                    '最大回撤 (%)': f"{metric['max_drawdown']:.2f}",
-                    '勝率 (%)': f"{metric['win_rate']:.2f}",
-                    '交易次數': metric['total_trades'],
-                })
-    
-    detailed_df = pd.DataFrame(detailed_results)
+    # 創建詳細結果 DataFrame（每檔股票 x 每個策略），數值保留為浮點數，寫入時再統一格式化
+    detailed_df = all_df.rename(columns={
+        'symbol': '股票代碼',
+        'name': '股票名稱',
+        'strategy': '策略',
+        'total_return': '總報酬率 (%)',
+        'annualized_return': '年化報酬率 (%)',
+        'volatility': '波動率 (%)',
+        'sharpe_ratio': '夏普比率',
+        'max_drawdown': '最大回撤 (%)',
+        'win_rate': '勝率 (%)',
+        'total_trades': '交易次數',
+    })
     
     # 確保輸出目錄存在
     output_dir = "results"
@@ -231,7 +216,7 @@ def main():
     
     # 保存詳細結果（使用整體日期範圍）
     detailed_file = os.path.join(output_dir, f"backtest_detailed_{overall_date_range}.csv")
-    detailed_df.to_csv(detailed_file, index=False, encoding='utf-8-sig')
+    detailed_df.to_csv(detailed_file, index=False, encoding='utf-8-sig', float_format='%.2f', na_rep='nan')
     print(f"✓ 詳細結果已保存至: {detailed_file}")
     
     # 保存總結結果（使用整體日期範圍）
@@ -240,19 +225,13 @@ def main():
     print(f"✓ 總結結果已保存至: {summary_file}")
     
     # 創建每檔股票的個別結果檔案（使用該股票的日期範圍）
-    for symbol, result in all_results.items():
-        stock_name = result['name']
-        stock_df = result.get('comparison_df', pd.DataFrame())
-        date_range = result.get('date_range', datetime.now().strftime("%Y%m%d"))
-        if not stock_df.empty:
-            # 添加股票資訊
-            stock_df = stock_df.copy()
-            stock_df.insert(0, '股票代碼', symbol)
-            stock_df.insert(1, '股票名稱', stock_name)
-            # 使用格式：股票代號_開始日期_to_結束日期.csv
-            stock_file = os.path.join(output_dir, f"{symbol}_{date_range}.csv")
-            stock_df.to_csv(stock_file, index=False, encoding='utf-8-sig')
-            print(f"✓ {stock_name} 結果已保存至: {stock_file}")
+    # 寫檔以 I/O 為主，以執行緒池同時寫入各檔案
+    with ThreadPoolExecutor(max_workers=min(len(all_results), 8) or 1) as executor:
+        stock_files = executor.map(_save_stock_result, all_results.keys(), all_results.values(),
+                                   [output_dir] * len(all_results))
+        for result, stock_file in zip(all_results.values(), stock_files):
+            if stock_file is not None:
+                print(f"✓ {result['name']} 結果已保存至: {stock_file}")
     
     print("\n回測完成！")
     print("=" * 60)
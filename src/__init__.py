@@ -1,13 +1,15 @@
 """
 Common Valid Strategy - 技術指標回測系統
 """
-from .indicators import TechnicalIndicators, INDICATOR_STRATEGIES
+from .indicators import TechnicalIndicators, INDICATOR_STRATEGIES, calculate_indicators_batch, strategy_inputs
 from .data_fetcher import DataFetcher, TAIWAN_STOCKS
 from .backtester import Backtester
 
 __all__ = [
     'TechnicalIndicators',
     'INDICATOR_STRATEGIES',
+    'calculate_indicators_batch',
+    'strategy_inputs',
     'DataFetcher',
     'TAIWAN_STOCKS',
     'Backtester',
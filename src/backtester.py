@@ -6,7 +6,249 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Callable
 from datetime import datetime
-from .indicators import TechnicalIndicators, INDICATOR_STRATEGIES
+from .indicators import TechnicalIndicators, INDICATOR_STRATEGIES, strategy_inputs
+from numba import njit, prange
+
+
+# 核心函數皆以明確的型別簽名宣告，於匯入時即完成編譯（搭配 cache=True 從快取載入）；
+# 輸入陣列一律宣告為唯讀，可同時接受一般陣列與 pandas copy-on-write 回傳的唯讀陣列
+@njit("int8[:](Array(boolean, 1, 'A', readonly=True), Array(boolean, 1, 'A', readonly=True))",
+      cache=True)
+def _position_loop(buy: np.ndarray, sell: np.ndarray) -> np.ndarray:
+    """
+    由買賣訊號推算每日持倉（0: 無持倉, 1: 持有多頭）
+
+    空手時遇到買入訊號則買入，持有時遇到賣出訊號則賣出；
+    持倉狀態依賴前一日，因此以 numba 編譯的迴圈處理。
+
+    Args:
+        buy: 買入訊號布林陣列
+        sell: 賣出訊號布林陣列
+
+    Returns:
+        持倉陣列（int8）
+    """
+    n = buy.shape[0]
+    out = np.zeros(n, dtype=np.int8)
+    position = 0
+    for i in range(n):
+        if buy[i] and position == 0:
+            position = 1
+        elif sell[i] and position == 1:
+            position = 0
+        out[i] = position
+    return out
+
+
+@njit("float64[:](Array(float64, 1, 'A', readonly=True), Array(int8, 1, 'A', readonly=True))",
+      cache=True)
+def _apply_position(pct_change: np.ndarray, position: np.ndarray) -> np.ndarray:
+    """
+    依前一日持倉計算策略每日報酬（當日訊號於次日生效）
+    
+    Args:
+        pct_change: 收盤價每日報酬率陣列
+        position: 持倉陣列
+    
+    Returns:
+        策略每日報酬陣列
+    """
+    n = pct_change.shape[0]
+    out = np.empty(n)
+    for i in range(n):
+        prev_position = position[i - 1] if i > 0 else 0
+        out[i] = pct_change[i] * prev_position
+    return out
+
+
+@njit("float64(Array(float64, 1, 'A', readonly=True))", cache=True)
+def _max_drawdown(returns: np.ndarray) -> float:
+    """
+    單次掃描計算最大回撤，不另外配置累積報酬與歷史高點陣列
+    
+    高點以第一天的淨值起算，與累積報酬序列的 expanding max 一致
+    
+    Args:
+        returns: 已去除 NaN 的策略每日報酬陣列（至少一筆）
+    
+    Returns:
+        最大回撤（小數，不大於 0）
+    """
+    equity = 1.0 + returns[0]
+    peak = equity
+    max_drawdown = 0.0
+    for i in range(1, returns.shape[0]):
+        equity *= 1.0 + returns[i]
+        if equity > peak:
+            peak = equity
+        drawdown = (equity - peak) / peak
+        if drawdown < max_drawdown:
+            max_drawdown = drawdown
+    return max_drawdown
+
+
+@njit("Tuple((float64, float64, float64, float64, float64, float64, int64))"
+      "(Array(float64, 1, 'A', readonly=True), Array(int8, 1, 'A', readonly=True), int64)",
+      cache=True)
+def _metrics_kernel(returns: np.ndarray, position: np.ndarray, trading_days: int) -> tuple:
+    """
+    以 NumPy 陣列計算策略績效指標
+    
+    Args:
+        returns: 已去除 NaN 的策略每日報酬陣列（至少一筆）
+        position: 持倉陣列
+        trading_days: 回測期間總交易日數
+    
+    Returns:
+        (總報酬率, 年化報酬率, 波動率, 夏普比率, 最大回撤, 勝率, 交易次數)，比率皆為小數
+    """
+    n = returns.shape[0]
+    
+    # 總報酬率
+    total_return = np.prod(1.0 + returns) - 1.0
+    
+    # 年化報酬率（假設一年約 252 個交易日）
+    years = trading_days / 252
+    annualized_return = (1.0 + total_return) ** (1.0 / years) - 1.0 if years > 0 else 0.0
+    
+    # 波動率（年化，樣本標準差）
+    if n > 1:
+        volatility = np.sqrt(np.sum((returns - returns.mean()) ** 2) / (n - 1)) * np.sqrt(252.0)
+    else:
+        volatility = np.nan
+    
+    # 夏普比率（假設無風險利率為 0）
+    sharpe_ratio = annualized_return / volatility if volatility > 0 else 0.0
+    
+    # 最大回撤
+    max_drawdown = _max_drawdown(returns)
+    
+    # 勝率
+    trades = returns[returns != 0]
+    win_rate = np.sum(trades > 0) / trades.shape[0] if trades.shape[0] > 0 else 0.0
+    
+    # 交易次數
+    total_trades = np.sum(np.abs(np.diff(position.astype(np.int64)))) // 2
+    
+    return (total_return, annualized_return, volatility, sharpe_ratio,
+            max_drawdown, win_rate, total_trades)
+
+
+@njit("Tuple((float64[:, :], int64[:]))"
+      "(Array(boolean, 2, 'A', readonly=True), Array(boolean, 2, 'A', readonly=True),"
+      " Array(float64, 1, 'A', readonly=True))",
+      parallel=True, cache=True)
+def _backtest_all(buys: np.ndarray, sells: np.ndarray, pct_change: np.ndarray) -> tuple:
+    """
+    以 prange 平行回測同一檔股票的多個策略
+    
+    Args:
+        buys: 形狀為 (n_strategies, n_bars) 的買入訊號陣列
+        sells: 形狀為 (n_strategies, n_bars) 的賣出訊號陣列
+        pct_change: 收盤價每日報酬率陣列
+    
+    Returns:
+        (各策略前六項績效指標陣列 (n_strategies, 6), 各策略交易次數陣列)，
+        沒有任何報酬數據的策略各項指標皆為 0
+    """
+    n_strategies, n_bars = buys.shape
+    values = np.zeros((n_strategies, 6))
+    total_trades = np.zeros(n_strategies, dtype=np.int64)
+    
+    for s in prange(n_strategies):
+        position = _position_loop(buys[s], sells[s])
+        returns = _apply_position(pct_change, position)
+        valid_returns = returns[~np.isnan(returns)]
+        if valid_returns.shape[0] == 0:
+            continue
+        
+        (total_return, annualized_return, volatility, sharpe_ratio,
+         max_drawdown, win_rate, trades) = _metrics_kernel(valid_returns, position, n_bars)
+        values[s, 0] = total_return
+        values[s, 1] = annualized_return
+        values[s, 2] = volatility
+        values[s, 3] = sharpe_ratio
+        values[s, 4] = max_drawdown
+        values[s, 5] = win_rate
+        total_trades[s] = trades
+    
+    return values, total_trades
+
+
+def _zero_metrics(strategy_name: str) -> Dict:
+    """
+    沒有任何報酬數據時的績效指標
+    
+    Args:
+        strategy_name: 策略名稱
+    
+    Returns:
+        各項指標皆為 0 的字典
+    """
+    return {
+        'strategy': strategy_name,
+        'total_return': 0.0,
+        'annualized_return': 0.0,
+        'volatility': 0.0,
+        'sharpe_ratio': 0.0,
+        'max_drawdown': 0.0,
+        'win_rate': 0.0,
+        'total_trades': 0,
+    }
+
+
+def _metrics(returns: np.ndarray, position: np.ndarray, strategy_name: str) -> Dict:
+    """
+    由每日報酬與持倉陣列計算績效指標
+    
+    Args:
+        returns: 策略每日報酬陣列（可含 NaN，例如第一天）
+        position: 持倉陣列
+        strategy_name: 策略名稱
+    
+    Returns:
+        包含各種績效指標的字典
+    """
+    # 從未持倉時每日報酬皆為 0，不需再計算各項指標
+    if not position.any():
+        return _zero_metrics(strategy_name)
+    
+    valid_returns = returns[~np.isnan(returns)]
+    if len(valid_returns) == 0:
+        return _zero_metrics(strategy_name)
+    
+    return _metrics_dict(strategy_name, *_metrics_kernel(valid_returns, position, len(returns)))
+
+
+def _metrics_dict(strategy_name: str,
+                  total_return: float,
+                  annualized_return: float,
+                  volatility: float,
+                  sharpe_ratio: float,
+                  max_drawdown: float,
+                  win_rate: float,
+                  total_trades: int) -> Dict:
+    """
+    將核心函數計算的指標整理為績效指標字典
+    
+    Args:
+        strategy_name: 策略名稱
+        total_return ~ win_rate: 各項績效指標（比率為小數）
+        total_trades: 交易次數
+    
+    Returns:
+        包含各種績效指標的字典（比率轉換為百分比）
+    """
+    return {
+        'strategy': strategy_name,
+        'total_return': total_return * 100,  # 轉換為百分比
+        'annualized_return': annualized_return * 100,
+        'volatility': volatility * 100,
+        'sharpe_ratio': sharpe_ratio,
+        'max_drawdown': max_drawdown * 100,
+        'win_rate': win_rate * 100,
+        'total_trades': int(total_trades),
+    }
 
 
 class Backtester:
@@ -27,7 +269,7 @@ class Backtester:
         self.initial_capital = initial_capital
         self.commission = commission
         self.tax = tax
-    
+
     def calculate_returns(self, 
                          data: pd.DataFrame,
                          buy_signal: Callable,
@@ -37,34 +279,28 @@ class Backtester:
         
         Args:
             data: 包含價格和技術指標的 DataFrame
-            buy_signal: 買入訊號函數
-            sell_signal: 賣出訊號函數
+            buy_signal: 買入訊號函數，接收 strategy_inputs(data) 回傳的 (cols, prev)
+            sell_signal: 賣出訊號函數，接收 strategy_inputs(data) 回傳的 (cols, prev)
         
         Returns:
             包含交易記錄和回報的 DataFrame
         """
-        result = data.copy()
-        result['Position'] = 0  # 0: 無持倉, 1: 持有多頭
-        result['Buy_Signal'] = False
-        result['Sell_Signal'] = False
-        result['Returns'] = 0.0
-        result['Cumulative_Returns'] = 0.0
-        
         # 計算買賣訊號
-        result['Buy_Signal'] = buy_signal(result)
-        result['Sell_Signal'] = sell_signal(result)
-        
-        # 計算持倉狀態
-        position = 0
-        for i in range(len(result)):
-            if result.iloc[i]['Buy_Signal'] and position == 0:
-                position = 1
-            elif result.iloc[i]['Sell_Signal'] and position == 1:
-                position = 0
-            result.iloc[i, result.columns.get_loc('Position')] = position
+        cols, prev = strategy_inputs(data)
+        buy = buy_signal(cols, prev)
+        sell = sell_signal(cols, prev)
+        
+        # 計算持倉狀態（numba 迴圈直接處理 NumPy 陣列，避免逐列 iloc 讀寫）
+        position_arr = _position_loop(buy, sell)
+        
+        # 各欄位於陣列計算完成後一次寫入，不預先建立再覆寫
+        result = data.copy()
+        result['Position'] = position_arr  # 0: 無持倉, 1: 持有多頭
+        result['Buy_Signal'] = buy
+        result['Sell_Signal'] = sell
         
         # 計算回報
-        result['Returns'] = result['Close'].pct_change() * result['Position'].shift(1)
+        result['Returns'] = _apply_position(data['Close'].pct_change().to_numpy(), position_arr)
         result['Cumulative_Returns'] = (1 + result['Returns']).cumprod() - 1
         
         return result
@@ -82,62 +318,9 @@ class Backtester:
         Returns:
             包含各種績效指標的字典
         """
-        returns = data['Returns'].dropna()
-        cumulative_returns = data['Cumulative_Returns'].iloc[-1]
-        
-        if len(returns) == 0:
-            return {
-                'strategy': strategy_name,
-                'total_return': 0.0,
-                'annualized_return': 0.0,
-                'volatility': 0.0,
-                'sharpe_ratio': 0.0,
-                'max_drawdown': 0.0,
-                'win_rate': 0.0,
-                'total_trades': 0,
-            }
-        
-        # 總報酬率
-        total_return = cumulative_returns
-        
-        # 年化報酬率（假設一年約 252 個交易日）
-        trading_days = len(data)
-        years = trading_days / 252
-        annualized_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0
-        
-        # 波動率（年化）
-        volatility = returns.std() * np.sqrt(252)
-        
-        # 夏普比率（假設無風險利率為 0）
-        sharpe_ratio = annualized_return / volatility if volatility > 0 else 0
-        
-        # 最大回撤
-        cumulative = (1 + returns).cumprod()
-        running_max = cumulative.expanding().max()
-        drawdown = (cumulative - running_max) / running_max
-        max_drawdown = drawdown.min()
-        
-        # 勝率
-        trades = returns[returns != 0]
-        if len(trades) > 0:
-            win_rate = (trades > 0).sum() / len(trades)
-        else:
-            win_rate = 0
-        
-        # 交易次數
-        position_changes = data['Position'].diff().abs().sum() / 2
-        total_trades = int(position_changes)
-        
-        return {
-            'strategy': strategy_name,
-            'total_return': total_return * 100,  # 轉換為百分比
-            'annualized_return': annualized_return * 100,
-            'volatility': volatility * 100,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown * 100,
-            'win_rate': win_rate * 100,
-            'total_trades': total_trades,
-        }
+        return _metrics(data['Returns'].to_numpy(dtype=np.float64),
+                        data['Position'].to_numpy(dtype=np.int8),
+                        strategy_name)
     
     def backtest_strategy(self,
                          data: pd.DataFrame,
@@ -179,15 +362,37 @@ class Backtester:
         """
         all_metrics = {}
         
-        for strategy_name in INDICATOR_STRATEGIES.keys():
+        # 收盤價報酬率與前一日數值與策略無關，只需計算一次；各策略直接以陣列運算，不複製整張 DataFrame
+        pct_change = data['Close'].pct_change().to_numpy()
+        cols, prev = strategy_inputs(data)
+        
+        signals = {}
+        for strategy_name, strategy in INDICATOR_STRATEGIES.items():
             try:
-                _, metrics = self.backtest_strategy(data, strategy_name)
-                all_metrics[strategy_name] = metrics
+                buy = strategy['buy_signal'](cols, prev)
+                sell = strategy['sell_signal'](cols, prev)
             except Exception as e:
                 print(f"回測策略 {strategy_name} 時發生錯誤: {e}")
                 all_metrics[strategy_name] = None
-        
-        return all_metrics
+                continue
+            
+            # 從未出現買入訊號的策略不會持倉，直接回傳零績效，不送入回測核心
+            if not buy.any():
+                all_metrics[strategy_name] = _zero_metrics(strategy_name)
+            else:
+                signals[strategy_name] = (buy, sell)
+        
+        # 所有策略的訊號堆疊為二維陣列，由單一 numba 平行核心同時回測
+        if signals:
+            buys = np.stack([buy for buy, _ in signals.values()])
+            sells = np.stack([sell for _, sell in signals.values()])
+            values, total_trades = _backtest_all(buys, sells, pct_change)
+            for i, strategy_name in enumerate(signals):
+                all_metrics[strategy_name] = _metrics_dict(strategy_name, *values[i].tolist(),
+                                                           int(total_trades[i]))
+        
+        # 維持 INDICATOR_STRATEGIES 的策略順序
+        return {strategy_name: all_metrics[strategy_name] for strategy_name in INDICATOR_STRATEGIES}
     
     def compare_strategies(self, metrics_dict: Dict) -> pd.DataFrame:
         """
@@ -205,6 +410,6 @@ class Backtester:
         if not valid_metrics:
             return pd.DataFrame()
         
-        df = pd.DataFrame(valid_metrics).T
-        return df
+        # 每個策略的指標即為一列，直接依列建立，不需轉置，各欄位也能保有數值型別
+        return pd.DataFrame.from_records(list(valid_metrics.values()), index=list(valid_metrics.keys()))
 
@@ -2,6 +2,7 @@
 台股數據獲取模組
 從 yfinance 獲取台灣股票市場數據
 """
+import os
 import yfinance as yf
 import pandas as pd
 from typing import List, Optional
@@ -34,12 +35,101 @@ TAIWAN_STOCKS = {
 }
 
 
+def _naive_index(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    將日期索引統一為不帶時區的當地日期
+    
+    Ticker.history 回傳帶 Asia/Taipei 時區的索引，yf.download 的日線則不帶時區；
+    兩者寫入同一個快取檔，需統一格式才能跨股票對齊日期
+    
+    Args:
+        data: 以日期為索引的 DataFrame
+    
+    Returns:
+        索引不帶時區的 DataFrame
+    """
+    if getattr(data.index, 'tz', None) is None:
+        return data
+    data = data.copy(deep=False)
+    data.index = data.index.tz_localize(None)
+    return data
+
+
 class DataFetcher:
     """台股數據獲取類別"""
     
-    def __init__(self):
-        """初始化數據獲取器"""
+    def __init__(self,
+                 cache_dir: Optional[str] = 'cache',
+                 cache_ttl: timedelta = timedelta(days=1)):
+        """
+        初始化數據獲取器
+        
+        Args:
+            cache_dir: 本地數據快取目錄，設為 None 則停用快取
+            cache_ttl: 快取有效期間，超過則重新下載，預設為 1 天
+        """
         self.stocks = TAIWAN_STOCKS
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+    
+    def _cache_path(self,
+                    symbol: str,
+                    period: str,
+                    start: Optional[str],
+                    end: Optional[str]) -> Optional[str]:
+        """
+        取得股票數據的快取檔案路徑
+        
+        Args:
+            symbol: 股票代碼
+            period: 數據期間
+            start: 開始日期
+            end: 結束日期
+        
+        Returns:
+            快取檔案路徑，停用快取時回傳 None
+        """
+        if not self.cache_dir:
+            return None
+        key = f"{start}_{end}" if start and end else period
+        return os.path.join(self.cache_dir, f"{symbol}_{key}.pkl")
+    
+    def _load_cache(self, cache_path: Optional[str]) -> Optional[pd.DataFrame]:
+        """
+        讀取未過期的快取數據
+        
+        Args:
+            cache_path: 快取檔案路徑
+        
+        Returns:
+            快取的 DataFrame，不存在或已過期時回傳 None
+        """
+        if cache_path is None or not os.path.exists(cache_path):
+            return None
+        
+        modified = datetime.fromtimestamp(os.path.getmtime(cache_path))
+        if datetime.now() - modified > self.cache_ttl:
+            return None
+        
+        try:
+            return _naive_index(pd.read_pickle(cache_path))
+        except Exception as e:
+            print(f"警告：無法讀取快取 {cache_path} - {e}")
+            return None
+    
+    def _save_cache(self, cache_path: Optional[str], data: pd.DataFrame):
+        """
+        將數據寫入快取
+        
+        Args:
+            cache_path: 快取檔案路徑
+            data: 要快取的 DataFrame
+        """
+        if cache_path is None or data.empty:
+            return
+        data.to_pickle(cache_path)
     
     def get_stock_data(self, 
                       symbol: str, 
@@ -58,6 +148,11 @@ class DataFetcher:
         Returns:
             包含 OHLCV 數據的 DataFrame
         """
+        cache_path = self._cache_path(symbol, period, start, end)
+        cached = self._load_cache(cache_path)
+        if cached is not None:
+            return cached
+        
         ticker = yf.Ticker(symbol)
         
         if start and end:
@@ -79,7 +174,9 @@ class DataFetcher:
         if 'Open' not in data.columns:
             data = data.rename(columns={data.columns[0]: 'Open'})
         
-        return data[['Open', 'High', 'Low', 'Close', 'Volume']]
+        data = _naive_index(data[['Open', 'High', 'Low', 'Close', 'Volume']])
+        self._save_cache(cache_path, data)
+        return data
     
     def get_multiple_stocks(self, 
                            symbols: Optional[List[str]] = None,
@@ -102,19 +199,46 @@ class DataFetcher:
             symbols = list(self.stocks.values())
         
         stock_data = {}
+        missing = []
         for symbol in symbols:
+            cached = self._load_cache(self._cache_path(symbol, period, start, end))
+            if cached is not None:
+                stock_data[symbol] = cached
+                print(f"從快取讀取 {symbol}，共 {len(cached)} 筆數據")
+            else:
+                missing.append(symbol)
+        
+        if not missing:
+            return stock_data
+        
+        # 以 yf.download 一次請求所有股票，由 yfinance 內部的執行緒池平行下載
+        print(f"正在批次獲取 {len(missing)} 檔股票的數據...")
+        download_kwargs = dict(group_by='ticker', threads=True, progress=False, auto_adjust=True)
+        try:
+            if start and end:
+                raw = yf.download(missing, start=start, end=end, **download_kwargs)
+            else:
+                raw = yf.download(missing, period=period, **download_kwargs)
+        except Exception as e:
+            print(f"錯誤：無法獲取 {', '.join(missing)} 的數據 - {e}")
+            return stock_data
+        
+        for symbol in missing:
             try:
-                print(f"正在獲取 {symbol} 的數據...")
-                data = self.get_stock_data(symbol, period=period, start=start, end=end)
+                # 各股票共用同一個日期索引，拆分後需去除該股票沒有交易的日期
+                data = raw[symbol] if isinstance(raw.columns, pd.MultiIndex) else raw
+                data = _naive_index(data[['Open', 'High', 'Low', 'Close', 'Volume']].dropna(how='all'))
                 if not data.empty:
                     stock_data[symbol] = data
+                    self._save_cache(self._cache_path(symbol, period, start, end), data)
                     print(f"成功獲取 {symbol}，共 {len(data)} 筆數據")
                 else:
                     print(f"警告：{symbol} 沒有數據")
             except Exception as e:
                 print(f"錯誤：無法獲取 {symbol} 的數據 - {e}")
         
-        return stock_data
+        # 維持輸入的股票順序
+        return {symbol: stock_data[symbol] for symbol in symbols if symbol in stock_data}
     
     def get_stock_name(self, symbol: str) -> str:
         """
@@ -2,9 +2,136 @@
 技術指標模組
 定義並計算各種技術指標，用於回測驗證
 """
+import numpy as np
 import pandas as pd
 import pandas_ta as ta
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Union
+from numba import njit, prange
+
+
+# 預設計算的移動平均線週期
+MA_PERIODS = [5, 10, 20, 60]
+
+
+def _rsi(close: Union[pd.Series, pd.DataFrame], length: int = 14) -> Union[pd.Series, pd.DataFrame]:
+    """
+    以 Wilder 平滑（RMA）計算 RSI，與 pandas-ta 的 ta.rsi 結果一致
+    
+    傳入 DataFrame 時每一欄視為一檔股票，一次計算所有欄位
+    
+    Args:
+        close: 收盤價 Series 或 DataFrame
+        length: RSI 計算週期
+    
+    Returns:
+        與輸入相同形狀的 RSI 值
+    """
+    delta = close.diff()
+    positive_avg = delta.clip(lower=0).ewm(alpha=1.0 / length, adjust=False).mean()
+    negative_avg = delta.clip(upper=0).ewm(alpha=1.0 / length, adjust=False).mean()
+    return 100 * positive_avg / (positive_avg + negative_avg.abs())
+
+
+@njit("float64[:, :](Array(float64, 2, 'A', readonly=True), Array(boolean, 2, 'A', readonly=True), int64)",
+      parallel=True, cache=True)
+def _rsi_2d(close: np.ndarray, traded: np.ndarray, length: int) -> np.ndarray:
+    """
+    對 (交易日, 股票) 二維收盤價陣列逐欄計算 RSI，以 prange 平行處理各檔股票
+    
+    每一欄略過 traded 為 False 的列（該股票沒有交易的日期）；股票本身日期中的 NaN 收盤價則與 pandas 相同，
+    平滑權重持續衰減，結果與對該股票單獨呼叫 _rsi 一致
+    
+    Args:
+        close: 形狀為 (n_bars, n_symbols) 的收盤價陣列
+        traded: 相同形狀的布林陣列，標示該日期是否屬於該股票的日期索引
+        length: RSI 計算週期
+    
+    Returns:
+        相同形狀的 RSI 陣列
+    """
+    n_bars, n_symbols = close.shape
+    out = np.full((n_bars, n_symbols), np.nan)
+    alpha = 1.0 / length
+    decay = 1.0 - alpha
+    
+    for j in prange(n_symbols):
+        prev_close = np.nan
+        positive_avg = np.nan
+        negative_avg = np.nan
+        old_weight = 1.0
+        for i in range(n_bars):
+            if not traded[i, j]:
+                continue
+            
+            price = close[i, j]
+            delta = price - prev_close
+            prev_close = price
+            
+            # 與 pandas ewm(alpha=1/length, adjust=False) 相同的遞迴式（ignore_na=False）
+            if np.isnan(positive_avg):
+                if not np.isnan(delta):
+                    positive_avg = delta if delta > 0 else 0.0
+                    negative_avg = delta if delta < 0 else 0.0
+            else:
+                old_weight *= decay
+                if not np.isnan(delta):
+                    positive = delta if delta > 0 else 0.0
+                    negative = delta if delta < 0 else 0.0
+                    if positive_avg != positive:
+                        positive_avg = (old_weight * positive_avg + alpha * positive) / (old_weight + alpha)
+                    if negative_avg != negative:
+                        negative_avg = (old_weight * negative_avg + alpha * negative) / (old_weight + alpha)
+                    old_weight = 1.0
+            
+            if np.isnan(positive_avg):
+                continue
+            denominator = positive_avg + abs(negative_avg)
+            if denominator != 0:
+                out[i, j] = 100.0 * positive_avg / denominator
+    return out
+
+
+def _sma(close: Union[pd.Series, pd.DataFrame], length: int) -> Union[pd.Series, pd.DataFrame]:
+    """
+    計算簡單移動平均，傳入 DataFrame 時對每一欄一次計算
+    
+    Args:
+        close: 收盤價 Series 或 DataFrame
+        length: 移動平均週期
+    
+    Returns:
+        與輸入相同形狀的移動平均值
+    """
+    return close.rolling(length, min_periods=length).mean()
+
+
+def _ema(close: pd.Series, length: int) -> pd.Series:
+    """
+    計算指數移動平均，以前 length 筆的簡單平均作為起始值，與 pandas-ta 的 ta.ema 結果一致
+    
+    Args:
+        close: 價格 Series
+        length: EMA 週期
+    
+    Returns:
+        EMA 值（前 length - 1 筆為 NaN）
+    """
+    seeded = close.copy()
+    seeded.iloc[length - 1] = close.iloc[:length].mean()
+    seeded.iloc[:length - 1] = np.nan
+    return seeded.ewm(span=length, adjust=False).mean()
+
+
+def _assign_columns(result: pd.DataFrame, columns: pd.DataFrame):
+    """
+    將指標 DataFrame 的各欄位依索引對齊寫入 result
+    
+    Args:
+        result: 要寫入的 DataFrame（直接修改）
+        columns: 與 result 相同索引的指標 DataFrame
+    """
+    for col in columns.columns:
+        result[col] = columns[col]
 
 
 class TechnicalIndicators:
@@ -31,7 +158,7 @@ class TechnicalIndicators:
         Returns:
             RSI 值序列
         """
-        rsi = ta.rsi(self.data['Close'], length=period)
+        rsi = _rsi(self.data['Close'], length=period)
         return rsi
     
     def calculate_macd(self, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.DataFrame:
@@ -44,12 +171,28 @@ class TechnicalIndicators:
             signal: 訊號線週期，預設為 9
         
         Returns:
-            包含 MACD, Signal, Histogram 的 DataFrame
+            包含 MACD, Signal, Histogram 的 DataFrame，數據不足時回傳 None
         """
-        macd = ta.macd(self.data['Close'], fast=fast, slow=slow, signal=signal)
-        return macd
+        if slow < fast:
+            fast, slow = slow, fast
+        
+        close = self.data['Close'].astype('float64')
+        if len(close) < slow + signal - 1:
+            return None
+        
+        macd = _ema(close, fast) - _ema(close, slow)
+        # 訊號線從 MACD 第一個有效值開始計算
+        signal_line = _ema(macd.loc[macd.first_valid_index():], signal)
+        histogram = macd - signal_line
+        
+        suffix = f'_{fast}_{slow}_{signal}'
+        return pd.DataFrame({
+            f'MACD{suffix}': macd,
+            f'MACDh{suffix}': histogram,
+            f'MACDs{suffix}': signal_line,
+        }, index=close.index)
     
-    def calculate_moving_averages(self, periods: list = [5, 10, 20, 60]) -> pd.DataFrame:
+    def calculate_moving_averages(self, periods: list = MA_PERIODS) -> pd.DataFrame:
         """
         計算移動平均線
         
@@ -61,7 +204,7 @@ class TechnicalIndicators:
         """
         ma_data = pd.DataFrame(index=self.data.index)
         for period in periods:
-            ma_data[f'MA{period}'] = ta.sma(self.data['Close'], length=period)
+            ma_data[f'MA{period}'] = _sma(self.data['Close'], period)
         return ma_data
     
     def calculate_bollinger_bands(self, period: int = 20, std: float = 2) -> pd.DataFrame:
@@ -133,26 +276,34 @@ class TechnicalIndicators:
                         k=k_period, d=d_period)
         return stoch
     
-    def calculate_all_indicators(self) -> pd.DataFrame:
+    def calculate_all_indicators(self,
+                                 rsi: Optional[pd.Series] = None,
+                                 ma_data: Optional[pd.DataFrame] = None) -> pd.DataFrame:
         """
         計算所有技術指標並合併到原始數據中
         
+        Args:
+            rsi: 已計算好的 RSI（例如由 calculate_indicators_batch 批次計算），None 則自行計算
+            ma_data: 已計算好的移動平均線，None 則自行計算
+        
         Returns:
             包含所有技術指標的 DataFrame
         """
         result = self.data.copy()
         
+        # 各指標直接以欄位寫入同一個 DataFrame，不以 pd.concat 反覆建立新的 DataFrame
         # RSI
-        result['RSI'] = self.calculate_rsi()
+        result['RSI'] = self.calculate_rsi() if rsi is None else rsi
         
         # MACD
         macd_data = self.calculate_macd()
         if macd_data is not None and not macd_data.empty:
-            result = pd.concat([result, macd_data], axis=1)
+            _assign_columns(result, macd_data)
         
         # 移動平均線
-        ma_data = self.calculate_moving_averages()
-        result = pd.concat([result, ma_data], axis=1)
+        if ma_data is None:
+            ma_data = self.calculate_moving_averages()
+        _assign_columns(result, ma_data)
         
         # 布林通道
         bb_data = self.calculate_bollinger_bands()
@@ -160,125 +311,236 @@ class TechnicalIndicators:
             # 確保必要的欄位存在
             required_bb_cols = ['BBL_20_2.0', 'BBU_20_2.0']
             if all(col in bb_data.columns for col in required_bb_cols):
-                result = pd.concat([result, bb_data], axis=1)
+                _assign_columns(result, bb_data)
             else:
                 print(f"警告：布林通道計算結果缺少必要欄位，預期: {required_bb_cols}，實際: {list(bb_data.columns)}")
         
         # 隨機指標
         stoch_data = self.calculate_stochastic()
         if stoch_data is not None and not stoch_data.empty:
-            result = pd.concat([result, stoch_data], axis=1)
+            _assign_columns(result, stoch_data)
         
         return result
 
 
+def _close_matrix(stock_data: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    將各股票的收盤價合併為一張寬表
+    
+    列為所有股票日期的聯集、欄為股票代碼，股票沒有交易的日期為 NaN，方便跨股票以向量化方式計算
+    
+    Args:
+        stock_data: 字典，key 為股票代碼，value 為 OHLCV DataFrame
+    
+    Returns:
+        (日期 x 股票代碼) 的收盤價 DataFrame
+    """
+    return pd.concat({symbol: data['Close'] for symbol, data in stock_data.items()}, axis=1)
+
+
+def _group_by_index(stock_data: Dict[str, pd.DataFrame]) -> List[List[str]]:
+    """
+    將日期索引完全相同的股票分為同一組
+    
+    Args:
+        stock_data: 字典，key 為股票代碼，value 為 OHLCV DataFrame
+    
+    Returns:
+        股票代碼分組列表
+    """
+    groups = []
+    for symbol, data in stock_data.items():
+        for index, symbols in groups:
+            if data.index.equals(index):
+                symbols.append(symbol)
+                break
+        else:
+            groups.append((data.index, [symbol]))
+    return [symbols for _, symbols in groups]
+
+
+def calculate_indicators_batch(stock_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    批次計算多檔股票的技術指標
+    
+    先將所有股票的收盤價合併為一張寬表（見 _close_matrix），RSI 由 numba 核心對所有股票一次平行計算；
+    移動平均線則對交易日相同的股票分組後整組計算，確保結果與逐檔計算一致；其餘指標仍逐檔計算。
+    
+    Args:
+        stock_data: 字典，key 為股票代碼，value 為 OHLCV DataFrame
+    
+    Returns:
+        字典，key 為股票代碼，value 為包含所有技術指標的 DataFrame
+    """
+    calculators = {symbol: TechnicalIndicators(data) for symbol, data in stock_data.items()}
+    if not calculators:
+        return {}
+    
+    all_close = _close_matrix(stock_data)
+    traded = np.column_stack([all_close.index.isin(stock_data[symbol].index) for symbol in all_close.columns])
+    rsi_all = pd.DataFrame(_rsi_2d(all_close.to_numpy(dtype=np.float64), traded, 14),
+                           index=all_close.index, columns=all_close.columns)
+    
+    results = {}
+    for symbols in _group_by_index(stock_data):
+        closes = all_close.loc[stock_data[symbols[0]].index, symbols]
+        ma_all = {period: _sma(closes, period) for period in MA_PERIODS}
+        
+        for symbol in symbols:
+            ma_data = pd.DataFrame({f'MA{period}': ma_all[period][symbol] for period in MA_PERIODS})
+            results[symbol] = calculators[symbol].calculate_all_indicators(
+                rsi=rsi_all[symbol].reindex(closes.index), ma_data=ma_data
+            )
+    
+    # 維持輸入的股票順序
+    return {symbol: results[symbol] for symbol in stock_data}
+
+
+# 策略使用的欄位，以及其中判斷交叉時需要前一日數值的欄位
+SIGNAL_COLUMNS = ['Close', 'RSI', 'MACD_12_26_9', 'MACDs_12_26_9', 'MA5', 'MA20',
+                  'BBL_20_2.0', 'BBU_20_2.0', 'STOCHk_14_3_3', 'STOCHd_14_3_3']
+PREVIOUS_BAR_COLUMNS = ['RSI', 'MACD_12_26_9', 'MACDs_12_26_9', 'MA5', 'MA20', 'Close', 'BBL_20_2.0']
+
+
+def _shift_one(values: np.ndarray) -> np.ndarray:
+    """
+    將陣列向後位移一日，第一天補 NaN（等同 Series.shift(1)）
+    
+    Args:
+        values: 一維數值陣列
+    
+    Returns:
+        位移後的 float64 陣列
+    """
+    shifted = np.empty(len(values))
+    shifted[:1] = np.nan
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+def strategy_inputs(data: pd.DataFrame) -> tuple:
+    """
+    一次取出策略所需欄位的 NumPy 陣列及其前一日數值，供所有策略的買賣訊號共用
+    
+    Args:
+        data: 包含價格和技術指標的 DataFrame
+    
+    Returns:
+        (cols, prev)：欄位名稱對應當日數值與前一日數值陣列的字典（缺少的欄位會略過）
+    """
+    cols = {col: data[col].to_numpy() for col in SIGNAL_COLUMNS if col in data.columns}
+    prev = {col: _shift_one(cols[col]) for col in PREVIOUS_BAR_COLUMNS if col in cols}
+    return cols, prev
+
+
 # 定義要驗證的技術指標策略
+# 訊號函數接收 (cols, prev)，皆為 strategy_inputs(data) 預先取出的 NumPy 陣列，回傳布林陣列
 INDICATOR_STRATEGIES = {
     'RSI': {
         'description': 'RSI 超買超賣策略',
-        'buy_signal': lambda data: (data['RSI'] < 30) & (data['RSI'].shift(1) >= 30),
-        'sell_signal': lambda data: (data['RSI'] > 70) & (data['RSI'].shift(1) <= 70),
+        'buy_signal': lambda cols, prev: (cols['RSI'] < 30) & (prev['RSI'] >= 30),
+        'sell_signal': lambda cols, prev: (cols['RSI'] > 70) & (prev['RSI'] <= 70),
     },
     'MACD': {
         'description': 'MACD 金叉死叉策略',
-        'buy_signal': lambda data: (data['MACD_12_26_9'] > data['MACDs_12_26_9']) & \
-                                   (data['MACD_12_26_9'].shift(1) <= data['MACDs_12_26_9'].shift(1)),
-        'sell_signal': lambda data: (data['MACD_12_26_9'] < data['MACDs_12_26_9']) & \
-                                    (data['MACD_12_26_9'].shift(1) >= data['MACDs_12_26_9'].shift(1)),
+        'buy_signal': lambda cols, prev: (cols['MACD_12_26_9'] > cols['MACDs_12_26_9']) & \
+                                         (prev['MACD_12_26_9'] <= prev['MACDs_12_26_9']),
+        'sell_signal': lambda cols, prev: (cols['MACD_12_26_9'] < cols['MACDs_12_26_9']) & \
+                                          (prev['MACD_12_26_9'] >= prev['MACDs_12_26_9']),
     },
     'MA_CROSS': {
         'description': '移動平均線交叉策略（5日線上穿20日線）',
-        'buy_signal': lambda data: (data['MA5'] > data['MA20']) & \
-                                   (data['MA5'].shift(1) <= data['MA20'].shift(1)),
-        'sell_signal': lambda data: (data['MA5'] < data['MA20']) & \
-                                    (data['MA5'].shift(1) >= data['MA20'].shift(1)),
+        'buy_signal': lambda cols, prev: (cols['MA5'] > cols['MA20']) & \
+                                         (prev['MA5'] <= prev['MA20']),
+        'sell_signal': lambda cols, prev: (cols['MA5'] < cols['MA20']) & \
+                                          (prev['MA5'] >= prev['MA20']),
     },
     'BOLLINGER': {
         'description': '布林通道策略（觸及下軌買入，觸及上軌賣出）',
-        'buy_signal': lambda data: (data['BBL_20_2.0'].notna()) & (data['Close'] <= data['BBL_20_2.0']),
-        'sell_signal': lambda data: (data['BBU_20_2.0'].notna()) & (data['Close'] >= data['BBU_20_2.0']),
+        'buy_signal': lambda cols, prev: (~np.isnan(cols['BBL_20_2.0'])) & (cols['Close'] <= cols['BBL_20_2.0']),
+        'sell_signal': lambda cols, prev: (~np.isnan(cols['BBU_20_2.0'])) & (cols['Close'] >= cols['BBU_20_2.0']),
     },
     'STOCHASTIC': {
         'description': 'KD 指標策略',
-        'buy_signal': lambda data: (data['STOCHk_14_3_3'] < 20) & \
-                                   (data['STOCHk_14_3_3'] > data['STOCHd_14_3_3']),
-        'sell_signal': lambda data: (data['STOCHk_14_3_3'] > 80) & \
-                                    (data['STOCHk_14_3_3'] < data['STOCHd_14_3_3']),
+        'buy_signal': lambda cols, prev: (cols['STOCHk_14_3_3'] < 20) & \
+                                         (cols['STOCHk_14_3_3'] > cols['STOCHd_14_3_3']),
+        'sell_signal': lambda cols, prev: (cols['STOCHk_14_3_3'] > 80) & \
+                                          (cols['STOCHk_14_3_3'] < cols['STOCHd_14_3_3']),
     },
     # ========== Multi-Indicator Strategies ==========
     'RSI_MACD': {
         'description': 'RSI + MACD 組合策略（RSI超賣且MACD金叉時買入）',
-        'buy_signal': lambda data: (data['RSI'] < 30) & \
-                                   (data['MACD_12_26_9'] > data['MACDs_12_26_9']) & \
-                                   (data['MACD_12_26_9'].shift(1) <= data['MACDs_12_26_9'].shift(1)),
-        'sell_signal': lambda data: (data['RSI'] > 70) | \
-                                    ((data['MACD_12_26_9'] < data['MACDs_12_26_9']) & \
-                                     (data['MACD_12_26_9'].shift(1) >= data['MACDs_12_26_9'].shift(1))),
+        'buy_signal': lambda cols, prev: (cols['RSI'] < 30) & \
+                                         (cols['MACD_12_26_9'] > cols['MACDs_12_26_9']) & \
+                                         (prev['MACD_12_26_9'] <= prev['MACDs_12_26_9']),
+        'sell_signal': lambda cols, prev: (cols['RSI'] > 70) | \
+                                          ((cols['MACD_12_26_9'] < cols['MACDs_12_26_9']) & \
+                                           (prev['MACD_12_26_9'] >= prev['MACDs_12_26_9'])),
     },
     'RSI_STOCHASTIC': {
         'description': 'RSI + KD 組合策略（兩者都顯示超賣時買入）',
-        'buy_signal': lambda data: (data['RSI'] < 30) & \
-                                   (data['STOCHk_14_3_3'] < 20) & \
-                                   (data['STOCHk_14_3_3'] > data['STOCHd_14_3_3']),
-        'sell_signal': lambda data: (data['RSI'] > 70) | \
-                                    ((data['STOCHk_14_3_3'] > 80) & \
-                                     (data['STOCHk_14_3_3'] < data['STOCHd_14_3_3'])),
+        'buy_signal': lambda cols, prev: (cols['RSI'] < 30) & \
+                                         (cols['STOCHk_14_3_3'] < 20) & \
+                                         (cols['STOCHk_14_3_3'] > cols['STOCHd_14_3_3']),
+        'sell_signal': lambda cols, prev: (cols['RSI'] > 70) | \
+                                          ((cols['STOCHk_14_3_3'] > 80) & \
+                                           (cols['STOCHk_14_3_3'] < cols['STOCHd_14_3_3'])),
     },
     'MACD_MA': {
         'description': 'MACD + 移動平均線組合策略（MACD金叉且價格在MA20上方）',
-        'buy_signal': lambda data: (data['MACD_12_26_9'] > data['MACDs_12_26_9']) & \
-                                   (data['MACD_12_26_9'].shift(1) <= data['MACDs_12_26_9'].shift(1)) & \
-                                   (data['Close'] > data['MA20']),
-        'sell_signal': lambda data: (data['MACD_12_26_9'] < data['MACDs_12_26_9']) & \
-                                    (data['MACD_12_26_9'].shift(1) >= data['MACDs_12_26_9'].shift(1)),
+        'buy_signal': lambda cols, prev: (cols['MACD_12_26_9'] > cols['MACDs_12_26_9']) & \
+                                         (prev['MACD_12_26_9'] <= prev['MACDs_12_26_9']) & \
+                                         (cols['Close'] > cols['MA20']),
+        'sell_signal': lambda cols, prev: (cols['MACD_12_26_9'] < cols['MACDs_12_26_9']) & \
+                                          (prev['MACD_12_26_9'] >= prev['MACDs_12_26_9']),
     },
     'RSI_BOLLINGER': {
         'description': 'RSI + 布林通道組合策略（RSI超賣且觸及布林下軌）',
-        'buy_signal': lambda data: (data['RSI'] < 30) & \
-                                   (data['BBL_20_2.0'].notna()) & \
-                                   (data['Close'] <= data['BBL_20_2.0']),
-        'sell_signal': lambda data: (data['RSI'] > 70) | \
-                                    ((data['BBU_20_2.0'].notna()) & (data['Close'] >= data['BBU_20_2.0'])),
+        'buy_signal': lambda cols, prev: (cols['RSI'] < 30) & \
+                                         (~np.isnan(cols['BBL_20_2.0'])) & \
+                                         (cols['Close'] <= cols['BBL_20_2.0']),
+        'sell_signal': lambda cols, prev: (cols['RSI'] > 70) | \
+                                          ((~np.isnan(cols['BBU_20_2.0'])) & (cols['Close'] >= cols['BBU_20_2.0'])),
     },
     'MACD_STOCHASTIC': {
         'description': 'MACD + KD 組合策略（MACD金叉且KD超賣）',
-        'buy_signal': lambda data: (data['MACD_12_26_9'] > data['MACDs_12_26_9']) & \
-                                   (data['MACD_12_26_9'].shift(1) <= data['MACDs_12_26_9'].shift(1)) & \
-                                   (data['STOCHk_14_3_3'] < 20) & \
-                                   (data['STOCHk_14_3_3'] > data['STOCHd_14_3_3']),
-        'sell_signal': lambda data: (data['MACD_12_26_9'] < data['MACDs_12_26_9']) & \
-                                    (data['MACD_12_26_9'].shift(1) >= data['MACDs_12_26_9'].shift(1)),
+        'buy_signal': lambda cols, prev: (cols['MACD_12_26_9'] > cols['MACDs_12_26_9']) & \
+                                         (prev['MACD_12_26_9'] <= prev['MACDs_12_26_9']) & \
+                                         (cols['STOCHk_14_3_3'] < 20) & \
+                                         (cols['STOCHk_14_3_3'] > cols['STOCHd_14_3_3']),
+        'sell_signal': lambda cols, prev: (cols['MACD_12_26_9'] < cols['MACDs_12_26_9']) & \
+                                          (prev['MACD_12_26_9'] >= prev['MACDs_12_26_9']),
     },
     'MA_BOLLINGER': {
         'description': '移動平均線 + 布林通道組合策略（觸及布林下軌且價格低於MA20時買入，或從下軌反彈突破MA20）',
-        'buy_signal': lambda data: ((data['BBL_20_2.0'].notna()) & \
-                                    (data['Close'] <= data['BBL_20_2.0']) & \
-                                    (data['Close'] <= data['MA20'])) | \
-                                   ((data['BBL_20_2.0'].notna()) & \
-                                    (data['Close'].shift(1) <= data['BBL_20_2.0'].shift(1)) & \
-                                    (data['Close'] > data['MA20']) & \
-                                    (data['Close'].shift(1) <= data['MA20'].shift(1))),
-        'sell_signal': lambda data: (data['Close'] < data['MA20']) | \
-                                    ((data['BBU_20_2.0'].notna()) & (data['Close'] >= data['BBU_20_2.0'])),
+        'buy_signal': lambda cols, prev: ((~np.isnan(cols['BBL_20_2.0'])) & \
+                                          (cols['Close'] <= cols['BBL_20_2.0']) & \
+                                          (cols['Close'] <= cols['MA20'])) | \
+                                         ((~np.isnan(cols['BBL_20_2.0'])) & \
+                                          (prev['Close'] <= prev['BBL_20_2.0']) & \
+                                          (cols['Close'] > cols['MA20']) & \
+                                          (prev['Close'] <= prev['MA20'])),
+        'sell_signal': lambda cols, prev: (cols['Close'] < cols['MA20']) | \
+                                          ((~np.isnan(cols['BBU_20_2.0'])) & (cols['Close'] >= cols['BBU_20_2.0'])),
     },
     'RSI_MACD_MA': {
         'description': 'RSI + MACD + 移動平均線三重組合策略（RSI超賣、MACD金叉且價格接近或低於MA20）',
-        'buy_signal': lambda data: (data['RSI'] < 30) & \
-                                   (data['MACD_12_26_9'] > data['MACDs_12_26_9']) & \
-                                   (data['MACD_12_26_9'].shift(1) <= data['MACDs_12_26_9'].shift(1)) & \
-                                   (data['Close'] <= data['MA20'] * 1.02),  # 允許價格在MA20附近（2%範圍內）
-        'sell_signal': lambda data: (data['RSI'] > 70) | \
-                                    ((data['MACD_12_26_9'] < data['MACDs_12_26_9']) & \
-                                     (data['MACD_12_26_9'].shift(1) >= data['MACDs_12_26_9'].shift(1))),
+        'buy_signal': lambda cols, prev: (cols['RSI'] < 30) & \
+                                         (cols['MACD_12_26_9'] > cols['MACDs_12_26_9']) & \
+                                         (prev['MACD_12_26_9'] <= prev['MACDs_12_26_9']) & \
+                                         (cols['Close'] <= cols['MA20'] * 1.02),  # 允許價格在MA20附近（2%範圍內）
+        'sell_signal': lambda cols, prev: (cols['RSI'] > 70) | \
+                                          ((cols['MACD_12_26_9'] < cols['MACDs_12_26_9']) & \
+                                           (prev['MACD_12_26_9'] >= prev['MACDs_12_26_9'])),
     },
     'MACD_MA_CROSS': {
         'description': 'MACD + 移動平均線交叉組合策略（MACD金叉且5日線上穿20日線）',
-        'buy_signal': lambda data: (data['MACD_12_26_9'] > data['MACDs_12_26_9']) & \
-                                   (data['MACD_12_26_9'].shift(1) <= data['MACDs_12_26_9'].shift(1)) & \
-                                   (data['MA5'] > data['MA20']) & \
-                                   (data['MA5'].shift(1) <= data['MA20'].shift(1)),
-        'sell_signal': lambda data: (data['MACD_12_26_9'] < data['MACDs_12_26_9']) & \
-                                    (data['MACD_12_26_9'].shift(1) >= data['MACDs_12_26_9'].shift(1)),
+        'buy_signal': lambda cols, prev: (cols['MACD_12_26_9'] > cols['MACDs_12_26_9']) & \
+                                         (prev['MACD_12_26_9'] <= prev['MACDs_12_26_9']) & \
+                                         (cols['MA5'] > cols['MA20']) & \
+                                         (prev['MA5'] <= prev['MA20']),
+        'sell_signal': lambda cols, prev: (cols['MACD_12_26_9'] < cols['MACDs_12_26_9']) & \
+                                          (prev['MACD_12_26_9'] >= prev['MACDs_12_26_9']),
     },
 }
 